@@ -1,23 +1,27 @@
+MAX_INTEGRATION_TIME = 1000000  # ms
+
+
+def _check_integration_time(value: float):
+    if value <= 0:
+        raise ValueError("Integration time must be a positive value.")
+    if value > MAX_INTEGRATION_TIME:
+        raise ValueError(f"Integration time must not exceed {MAX_INTEGRATION_TIME} ms.")
+
+
 class IntegrationTime:
     def __init__(self, value: float = 1000):
-        if value <= 0:
-            raise ValueError("Integration time must be a positive value.")
-        if value > 1000000:
-            raise ValueError("Integration time must not exceed 1000000 ms.")
-        self.value = value
+        self.set_integration_time(value)
 
     def set_integration_time(self, value: float):
-        if value <= 0:
-            raise ValueError("Integration time must be a positive value.")
-        if value > 1000000:
-            raise ValueError("Integration time must not exceed 1000000 ms.")
+        _check_integration_time(value)
         self.value = value
+        self._seconds = value / 1000.0  # to_seconds is called at every measured point
 
     def __str__(self):
         return f"Integration Time: {self.value} ms"
-    
+
     def to_seconds(self) -> float:
         """
         Convert integration time from milliseconds to seconds.
         """
-        return self.value / 1000.0
\ No newline at end of file
+        return self._seconds
\ No newline at end of file
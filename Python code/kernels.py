@@ -0,0 +1,45 @@
+import numpy as np
+
+"""
+Step <-> wavelength conversions of the monochromators, applied to whole numpy arrays of a scan.
+Compiled with numba when it is installed, plain numpy otherwise.
+"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # numba is optional, without it the kernels stay regular numpy functions
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+@njit(cache=True)
+def step_to_wl_linear(steps, offset, coef):
+    """
+    Wavelengths of a monochromator with a linear step-wavelength relation (type A).
+    """
+    return offset + coef * steps
+
+@njit(cache=True)
+def wl_to_step_linear(wls, offset, coef):
+    """
+    Step positions of a monochromator with a linear step-wavelength relation (type A), as floats.
+    """
+    return (wls - offset) / coef
+
+@njit(cache=True)
+def step_to_wl_sin(steps, offset, coef, phase):
+    """
+    Wavelengths of a monochromator with a sine step-wavelength relation (type B).
+    """
+    return offset + coef * np.sin(phase * steps)
+
+@njit(cache=True)
+def wl_to_step_sin(wls, offset, coef, phase):
+    """
+    Step positions of a monochromator with a sine step-wavelength relation (type B), as floats.
+    NaN for a wavelength outside the range of the sine.
+    """
+    return np.arcsin((wls - offset) / coef) / phase
@@ -1,7 +1,14 @@
+import logging
 import os
+import pickle
+from functools import lru_cache
 from time import sleep
 import yaml
-from monochromator import MonochromatorA, MonochromatorB
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+from monochromator import MonochromatorA, MonochromatorB, openSerial, closeSerial
 from waveLength import WaveLength, WLRange
 from slit import Slit
 from measure import EmScanMeasure, ExScanMeasure, synchroScanMeasure, uniqueWLMeasure
@@ -11,14 +18,51 @@ from integrationTime import IntegrationTime
 # Si le programme est exécuté depuis le script Python
 application_path = os.path.dirname(os.path.abspath(__file__))
 
+# Parsed YAML files are cached in memory and in a "<file>.cache.pkl" sidecar.
+# Set SPECTRO_YAML_CACHE=0 to always reparse (e.g. while editing the configs).
+yaml_cache_enabled = os.environ.get('SPECTRO_YAML_CACHE', '1') != '0'
+
+# Per-step scan and serial messages are logged at DEBUG level, set SPECTRO_LOG_LEVEL=DEBUG to show them.
+logging.basicConfig(level=os.environ.get('SPECTRO_LOG_LEVEL', 'INFO').upper(), format='%(name)s: %(message)s')
+
+
+def parse_yaml(file_path):
+    # binary mode lets libyaml read the byte stream directly
+    with open(file_path, 'rb') as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+@lru_cache(maxsize=32)
+def load_cached_yaml(file_path, mtime_ns, size):
+    """
+    Return the content of a YAML file, using the pickle sidecar when it matches the file's mtime and size.
+    The mtime and size are part of the cache key so an edited file is reparsed.
+    """
+    cache_path = file_path + '.cache.pkl'
+    try:
+        with open(cache_path, 'rb') as cache:
+            cached_mtime_ns, cached_size, content = pickle.load(cache)
+        if cached_mtime_ns == mtime_ns and cached_size == size:
+            return content
+    except Exception:
+        pass  # missing or unreadable cache, parse the YAML file
+
+    content = parse_yaml(file_path)
+    try:
+        with open(cache_path, 'wb') as cache:
+            pickle.dump((mtime_ns, size, content), cache, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"Could not write YAML cache {cache_path}: {e}")
+    return content
 
 def read_yaml(file_path):
-    with open(file_path, 'r') as file:
-        return yaml.safe_load(file)
+    if not yaml_cache_enabled:
+        return parse_yaml(file_path)
+    stat = os.stat(file_path)
+    return load_cached_yaml(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
 
 def print_yaml_content(file_path):
     content = read_yaml(file_path)
-    print(yaml.dump(content, default_flow_style=False))
+    print(yaml.dump(content, Dumper=SafeDumper, default_flow_style=False))
     
 def createConfiguredMonochromators(config):
     """
@@ -26,6 +70,7 @@ def createConfiguredMonochromators(config):
     Returns a dict: {'excitation': ..., 'emission': ...}
     """
     monos = {}
+    serial_pool = {}  # one connection per physical port, shared by the devices configured on it
     for mono_key in ['excitation monochromator', 'emission monochromator']:
         mono_conf = config.get(mono_key, {})
         mono_type = mono_conf.get('type', 'A')
@@ -39,10 +84,13 @@ def createConfiguredMonochromators(config):
         wLOffset = WaveLength(offset)
         is_ex = mono_key == 'excitation monochromator'
         is_em = mono_key == 'emission monochromator'
+        if port not in serial_pool:
+            serial_pool[port] = openSerial(port, baud)
+        conn = serial_pool[port]
 
         if mono_type == 'A':
             mono = MonochromatorA(
-                wLValue, wLOffset, coeff, port, baud, 0, min_step, max_step, em=is_em, ex=is_ex
+                wLValue, wLOffset, coeff, port, baud, 0, min_step, max_step, em=is_em, ex=is_ex, serialConnection=conn
             )
         elif mono_type == 'B':
             # For B, get phase and slits if present
@@ -60,13 +108,21 @@ def createConfiguredMonochromators(config):
                 coefWL=slit_coeff, step=0, minStep=slit_min, maxStep=slit_max
             )
             mono = MonochromatorB(
-                wLValue, wLOffset, coeff, phase, slits, port, baud, 0, min_step, max_step, em=is_em, ex=is_ex
+                wLValue, wLOffset, coeff, phase, slits, port, baud, 0, min_step, max_step, em=is_em, ex=is_ex,
+                serialConnection=conn
             )
         else:
             raise ValueError(f"Unknown monochromator type: {mono_type}")
         monos[mono_key] = mono
     return monos
 
+def closeMonochromators(monochromators):
+    """
+    Close the serial connections of the monochromators, e.g. before they are created again.
+    """
+    for mono in monochromators.values():
+        closeSerial(mono.serialConnection)
+
 def createMesurements(monochromators, measurements_config):
     # returns dictionnary of the measurements inside the yaml config measurements_config
     measures = {}
@@ -145,7 +201,8 @@ def interactive_run():
 
     # 3. List YAML files in Measure Config folder
     measure_folder = os.path.join(application_path, 'Measure Config')
-    files = [f for f in os.listdir(measure_folder) if f.endswith('.yml') or f.endswith('.yaml')]
+    with os.scandir(measure_folder) as entries:
+        files = sorted(e.name for e in entries if e.name.endswith(('.yml', '.yaml')) and e.is_file())
     print("\nAvailable measurement config files:")
     for idx, fname in enumerate(files):
         print(f"{idx+1}: {fname}")
@@ -174,9 +231,9 @@ def interactive_run():
 
     # 6. Print min/max wavelength and resolution info
     for key, mono in monochromators.items():
-        min_wl = mono.getWaveLengthFromStep(mono.minWLStep)
-        max_wl = mono.getWaveLengthFromStep(mono.maxWLStep)
-        print(f"{key}: Min WL = {min_wl.value} nm, Max WL = {max_wl.value} nm")
+        min_wl = mono.getWaveLengthValueFromStep(mono.minWLStep)
+        max_wl = mono.getWaveLengthValueFromStep(mono.maxWLStep)
+        print(f"{key}: Min WL = {min_wl} nm, Max WL = {max_wl} nm")
         if isinstance(mono, MonochromatorB):
             print(f"Resolution range: {mono.slits.offsetWL.value} to {mono.slits.offsetWL.value + mono.slits.coefWL * mono.slits.maxStep}")
 
@@ -184,9 +241,11 @@ def interactive_run():
     confirm = input("Does everything look correct? (yes/no): ").strip().lower()
     if confirm == "no":
         print("Cancelling. Returning to file selection.")
+        closeMonochromators(monochromators)
         return interactive_run()
     elif confirm != "yes":
         print("Invalid input. Exiting.")
+        closeMonochromators(monochromators)
         return interactive_run()
 
     # 8. Run measurements in order
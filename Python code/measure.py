@@ -2,10 +2,25 @@ from spectro_signal import Signal
 from monochromator import Monochromator
 from waveLength import WaveLength, WLRange
 from integrationTime import IntegrationTime
+import csv
+import logging
+import os
 from time import sleep
-from numpy import arange
+import numpy as np
 from datetime import datetime
 
+# Column header row shared by the CSV files of every measure
+CSV_COLUMNS = ('Ex Wavelength (nm)', 'Em Wavelength (nm)', 'Measured Signal', 'Reference Signal')
+
+log = logging.getLogger(__name__)
+
+def _wavelengthColumn(values) -> list:
+    """
+    Wavelengths of a CSV column, whole values written as integers (200 rather than 200.0)
+    like the integer wavelengths of the measure configs.
+    """
+    return [int(wl) if wl.is_integer() else wl for wl in np.asarray(values, dtype=np.float64).tolist()]
+
 """
 Abstract base class for measures. Not meant to be instantiated directly.
 """
@@ -13,7 +28,7 @@ Abstract base class for measures. Not meant to be instantiated directly.
 class Measure:
     def __init__(self, name: str, em_range, ex_range, integrationTime:IntegrationTime,
                 ex_Monochromator: Monochromator, em_Monochromator: Monochromator, resolution: float = 0.1,
-                measured_signal: Signal = Signal("Measured signal"), reference_signal: Signal = Signal("Reference signal"), 
+                measured_signal: Signal = None, reference_signal: Signal = None, 
                 **kwargs):
         """
         Initialize the Measure class with the given parameters.
@@ -31,8 +46,9 @@ class Measure:
             raise ValueError("em_Monochromator must be an emission monochromator.")
         self.em_monochromator = em_Monochromator
 
-        self.measured_signal = Signal(f"{self.name} : Measured signal")
-        self.reference_signal = Signal(f"{self.name} : Reference signal")
+        # None defaults: a Signal default argument would be built once and shared by every measure
+        self.measured_signal = measured_signal if measured_signal is not None else Signal(f"{self.name} : Measured signal")
+        self.reference_signal = reference_signal if reference_signal is not None else Signal(f"{self.name} : Reference signal")
 
     def __str__(self):
         """
@@ -59,6 +75,39 @@ class Measure:
         """
         return 32
 
+    def sharedSerialPort(self) -> bool:
+        """
+        True if both monochromators use the same serial connection. Their replies can then not be told apart,
+        so a move has to complete before the other monochromator is commanded.
+        """
+        return self.ex_monochromator.serialConnection is self.em_monochromator.serialConnection
+
+    def prepareMeasure(self, ex_wl: WaveLength, em_wl: WaveLength):
+        """
+        Set the resolution, open the shutters, then bring both monochromators to their first wavelength.
+        The boards handle one command at a time, so the shutters are opened before the moves are sent:
+        sent after a move, a shutter would only open once the move is done and could still be closed
+        when the first point is measured. The two moves overlap when the monochromators have their own port.
+        Moves within a scan are not overlapped with the integration time, the signal has to be measured
+        with the monochromators at rest.
+        """
+        ex_step = self.ex_monochromator.getStepFromWL(ex_wl)
+        em_step = self.em_monochromator.getStepFromWL(em_wl)
+        # both targets are checked before anything moves
+        self.ex_monochromator.checkSteps(ex_step)
+        self.em_monochromator.checkSteps(em_step)
+        self.ex_monochromator.setResolution(self.resolution)
+        self.em_monochromator.setResolution(self.resolution)
+        self.ex_monochromator.openShutter()
+        self.em_monochromator.openShutter()
+        log.debug("Moving to excitation wavelength: %s nm, emission wavelength: %s nm", ex_wl.value, em_wl.value)
+        self.ex_monochromator.startMoveToStep(ex_step)
+        if self.sharedSerialPort():
+            self.ex_monochromator.waitForMove()
+        self.em_monochromator.startMoveToStep(em_step)
+        self.ex_monochromator.waitForMove()
+        self.em_monochromator.waitForMove()
+
     def measure(self, *args, **kwargs):
         """
         Abstract method to be implemented by subclasses.
@@ -83,8 +132,8 @@ class Measure:
 class uniqueWLMeasure(Measure):
     def __init__(self, name: str, em_range: WaveLength, ex_range: WaveLength, integrationTime: IntegrationTime,
                  ex_Monochromator: Monochromator, em_Monochromator: Monochromator, resolution: float = 0.1,
-                 measured_signal: Signal = Signal("Measured signal"),
-                 reference_signal: Signal = Signal("Reference signal")):
+                 measured_signal: Signal = None,
+                 reference_signal: Signal = None):
         super().__init__(name, em_range, ex_range, integrationTime,
                          ex_Monochromator, em_Monochromator, resolution,
                          measured_signal, reference_signal)
@@ -96,12 +145,7 @@ class uniqueWLMeasure(Measure):
         Implement the logic for measuring in the unique wavelength measure.
         """
         print(f"Measuring {self.name} at unique wavelengths.")
-        self.ex_monochromator.moveToWaveLength(self.ex_range)
-        self.em_monochromator.moveToWaveLength(self.em_range)
-        self.ex_monochromator.setResolution(self.resolution)
-        self.em_monochromator.setResolution(self.resolution)
-        self.ex_monochromator.openShutter()
-        self.em_monochromator.openShutter()
+        self.prepareMeasure(self.ex_range, self.em_range)
         self.measured_signal.append_signal(self.measureSignal())
         self.reference_signal.append_signal(self.measureReference())
         print(f"Measured signal: {self.measured_signal}, Reference signal: {self.reference_signal}")
@@ -112,28 +156,27 @@ class uniqueWLMeasure(Measure):
         """
         Save the results of the measurement to a CSV file.
         """
-        import csv
-        import os
-
         if not os.path.exists(folder):
             os.makedirs(folder)
 
         filename = os.path.join(folder, f"{self.name}.csv")
         with open(filename, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
-            now = datetime.now()
-            writer.writerow(['Date :', now.strftime("%Y-%m-%d"), 'Time :', now.strftime("%H:%M:%S"), 'Name :', self.name])
-            writer.writerow(['Ex Wavelength (nm)', 'Em Wavelength (nm)', 'Measured Signal', 'Reference Signal'])
-            for i in range(len(self.measured_signal.signal)):
-                writer.writerow([self.ex_range.value, self.em_range.value, self.measured_signal.signal[i], self.reference_signal.signal[i]])
+            date, hour = datetime.now().isoformat(sep=' ', timespec='seconds').split(' ')
+            writer.writerow(['Date :', date, 'Time :', hour, 'Name :', self.name])
+            writer.writerow(CSV_COLUMNS)
+            # single point measure, one row to write
+            if len(self.measured_signal.signal):
+                ex, em = _wavelengthColumn((self.ex_range, self.em_range))
+                writer.writerow([ex, em, self.measured_signal.signal[0], self.reference_signal.signal[0]])
 
         print(f"Results saved to {filename} in {folder}")        
 
 class synchroScanMeasure(Measure):
     def __init__(self, name: str, em_range: WaveLength, ex_range: WLRange, integrationTime: IntegrationTime,
                  ex_Monochromator: Monochromator, em_Monochromator: Monochromator, resolution: float = 0.1,
-                 measured_signal: Signal = Signal("Measured signal"),
-                 reference_signal: Signal = Signal("Reference signal")):
+                 measured_signal: Signal = None,
+                 reference_signal: Signal = None):
         super().__init__(name, em_range, ex_range, integrationTime,
                          ex_Monochromator, em_Monochromator, resolution,
                          measured_signal, reference_signal)
@@ -146,18 +189,44 @@ class synchroScanMeasure(Measure):
         Implement the logic for measuring in the synchronized scan.
         """
         print(f"Measuring {self.name} with synchronized scan.")
-        self.ex_monochromator.openShutter()
-        self.em_monochromator.openShutter()
-        self.ex_monochromator.setResolution(self.resolution)
-        self.em_monochromator.setResolution(self.resolution)
-        for i in arange(self.ex_range.wLMin.value, self.ex_range.wLMax.value+self.ex_range.wLStep.value, self.ex_range.wLStep.value):
-            current_ex_wl = WaveLength(i)
-            print(f"Moving to excitation wavelength: {current_ex_wl.value} nm")
-            self.ex_monochromator.moveToWaveLength(current_ex_wl)
-            print(f"Moving to emission wavelength: {current_ex_wl.value + self.em_range.value} nm")
-            self.em_monochromator.moveToWaveLength(WaveLength(current_ex_wl.value + self.em_range.value))
-            self.measured_signal.append_signal(self.measureSignal())
-            self.reference_signal.append_signal(self.measureReference())
+        wLMin = self.ex_range.wLMin.value
+        wLStep = self.ex_range.wLStep.value
+        em_offset = self.em_range.value
+        point_count = self.ex_range.stepCount() + 1
+        # convert the whole scan path to motor steps once, and reject it before the first move
+        ex_wls = wLMin + np.arange(point_count)*wLStep
+        ex_steps = self.ex_monochromator.getStepsFromWLs(ex_wls)
+        em_steps = self.em_monochromator.getStepsFromWLs(ex_wls + em_offset)
+        self.ex_monochromator.checkSteps(ex_steps)
+        self.em_monochromator.checkSteps(em_steps)
+        ex_steps = ex_steps.tolist()
+        em_steps = em_steps.tolist()
+        self.prepareMeasure(WaveLength(wLMin), WaveLength(wLMin + em_offset))
+        # bind the per-step calls to locals, they are resolved once instead of at every step
+        # with one serial port per monochromator the two moves are sent together and overlap
+        shared_port = self.sharedSerialPort()
+        ex_start_move = self.ex_monochromator.startMoveToStep
+        em_start_move = self.em_monochromator.startMoveToStep
+        ex_wait_move = self.ex_monochromator.waitForMove
+        em_wait_move = self.em_monochromator.waitForMove
+        append_measured = self.measured_signal.append_signal
+        append_reference = self.reference_signal.append_signal
+        measure_signal = self.measureSignal
+        measure_reference = self.measureReference
+        self.measured_signal.preallocate(point_count)
+        self.reference_signal.preallocate(point_count)
+        for k in range(point_count):
+            ex_wl = wLMin + k*wLStep
+            log.debug("Moving to excitation wavelength: %s nm", ex_wl)
+            ex_start_move(ex_steps[k])
+            if shared_port:
+                ex_wait_move()
+            log.debug("Moving to emission wavelength: %s nm", ex_wl + em_offset)
+            em_start_move(em_steps[k])
+            ex_wait_move()
+            em_wait_move()
+            append_measured(measure_signal())
+            append_reference(measure_reference())
         self.ex_monochromator.closeShutter()
         self.em_monochromator.closeShutter()
     
@@ -165,20 +234,19 @@ class synchroScanMeasure(Measure):
         """
         Save the results of the measurement to a CSV file.
         """
-        import csv
-        import os
-
         if not os.path.exists(folder):
             os.makedirs(folder)
 
         filename = os.path.join(folder, f"{self.name}.csv")
         with open(filename, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
-            now = datetime.now()
-            writer.writerow(['Date :', now.strftime("%Y-%m-%d"), 'Time :', now.strftime("%H:%M:%S"), 'Name :', self.name])
-            writer.writerow(['Ex Wavelength (nm)', 'Em Wavelength (nm)', 'Measured Signal', 'Reference Signal'])
-            for i in range(len(self.measured_signal.signal)):
-                writer.writerow([self.ex_range.wLMin.value + i*self.ex_range.wLStep.value, self.ex_range.wLMin.value + i*self.ex_range.wLStep.value +self.em_range.value, self.measured_signal.signal[i], self.reference_signal.signal[i]])
+            date, hour = datetime.now().isoformat(sep=' ', timespec='seconds').split(' ')
+            writer.writerow(['Date :', date, 'Time :', hour, 'Name :', self.name])
+            writer.writerow(CSV_COLUMNS)
+            n = len(self.measured_signal.signal)
+            ex = self.ex_range.wLMin.value + np.arange(n)*self.ex_range.wLStep.value
+            writer.writerows(zip(_wavelengthColumn(ex), _wavelengthColumn(ex + self.em_range.value),
+                                 self.measured_signal.signal.tolist(), self.reference_signal.signal.tolist()))
 
         print(f"Results saved to {filename} in {folder}")
 
@@ -186,8 +254,8 @@ class synchroScanMeasure(Measure):
 class ExScanMeasure(Measure):
     def __init__(self, name: str, em_range: WaveLength, ex_range: WLRange, integrationTime: IntegrationTime,
                  ex_Monochromator: Monochromator, em_Monochromator: Monochromator, resolution: float = 0.1,
-                 measured_signal: Signal = Signal("Measured signal"),
-                 reference_signal: Signal = Signal("Reference signal")):
+                 measured_signal: Signal = None,
+                 reference_signal: Signal = None):
         super().__init__(name, em_range, ex_range, integrationTime,
                          ex_Monochromator, em_Monochromator, resolution,
                          measured_signal, reference_signal)
@@ -196,17 +264,25 @@ class ExScanMeasure(Measure):
 
     def measure(self):
         print(f"Measuring {self.name} with excitation scan.")
-        self.em_monochromator.moveToWaveLength(self.em_range)
-        self.ex_monochromator.openShutter()
-        self.em_monochromator.openShutter()
-        self.ex_monochromator.setResolution(self.resolution)
-        self.em_monochromator.setResolution(self.resolution)
-        for i in arange(self.ex_range.wLMin.value, self.ex_range.wLMax.value+self.ex_range.wLStep.value, self.ex_range.wLStep.value):
-            current_ex_wl = WaveLength(i)
-            print(f"Moving to excitation wavelength: {current_ex_wl.value} nm")
-            self.ex_monochromator.moveToWaveLength(current_ex_wl)
-            self.measured_signal.append_signal(self.measureSignal())
-            self.reference_signal.append_signal(self.measureReference())
+        wLMin = self.ex_range.wLMin.value
+        wLStep = self.ex_range.wLStep.value
+        point_count = self.ex_range.stepCount() + 1
+        ex_steps = self.ex_monochromator.getStepsFromWLs(wLMin + np.arange(point_count)*wLStep)
+        self.ex_monochromator.checkSteps(ex_steps)
+        ex_steps = ex_steps.tolist()
+        self.prepareMeasure(WaveLength(wLMin), self.em_range)
+        ex_move = self.ex_monochromator.moveToStep
+        append_measured = self.measured_signal.append_signal
+        append_reference = self.reference_signal.append_signal
+        measure_signal = self.measureSignal
+        measure_reference = self.measureReference
+        self.measured_signal.preallocate(point_count)
+        self.reference_signal.preallocate(point_count)
+        for k in range(point_count):
+            log.debug("Moving to excitation wavelength: %s nm", wLMin + k*wLStep)
+            ex_move(ex_steps[k])
+            append_measured(measure_signal())
+            append_reference(measure_reference())
         self.ex_monochromator.closeShutter()
         self.em_monochromator.closeShutter()
 
@@ -214,28 +290,27 @@ class ExScanMeasure(Measure):
         """
         Save the results of the measurement to a CSV file.
         """
-        import csv
-        import os
-
         if not os.path.exists(folder):
             os.makedirs(folder)
 
         filename = os.path.join(folder, f"{self.name}.csv")
         with open(filename, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
-            now = datetime.now()
-            writer.writerow(['Date :', now.strftime("%Y-%m-%d"), 'Time :', now.strftime("%H:%M:%S"), 'Name :', self.name])
-            writer.writerow(['Ex Wavelength (nm)', 'Em Wavelength (nm)', 'Measured Signal', 'Reference Signal'])
-            for i in range(len(self.measured_signal.signal)):
-                writer.writerow([self.ex_range.wLMin.value + i*self.ex_range.wLStep.value, self.em_range.value, self.measured_signal.signal[i], self.reference_signal.signal[i]])
+            date, hour = datetime.now().isoformat(sep=' ', timespec='seconds').split(' ')
+            writer.writerow(['Date :', date, 'Time :', hour, 'Name :', self.name])
+            writer.writerow(CSV_COLUMNS)
+            n = len(self.measured_signal.signal)
+            ex = self.ex_range.wLMin.value + np.arange(n)*self.ex_range.wLStep.value
+            writer.writerows(zip(_wavelengthColumn(ex), _wavelengthColumn(np.full(n, self.em_range.value)),
+                                 self.measured_signal.signal.tolist(), self.reference_signal.signal.tolist()))
 
         print(f"Results saved to {filename} in {folder}")
 
 class EmScanMeasure(Measure):
     def __init__(self, name: str, em_range: WLRange, ex_range: WaveLength, integrationTime: IntegrationTime,
                  ex_Monochromator: Monochromator, em_Monochromator: Monochromator, resolution: float = 0.1,
-                 measured_signal: Signal = Signal("Measured signal"),
-                 reference_signal: Signal = Signal("Reference signal"), **kwargs):
+                 measured_signal: Signal = None,
+                 reference_signal: Signal = None, **kwargs):
         super().__init__(name, em_range, ex_range, integrationTime,
                          ex_Monochromator, em_Monochromator, resolution,
                          measured_signal, reference_signal, **kwargs)
@@ -244,17 +319,25 @@ class EmScanMeasure(Measure):
     
     def measure(self):
         print(f"Measuring {self.name} with emission scan.")
-        self.ex_monochromator.moveToWaveLength(self.ex_range)
-        self.ex_monochromator.openShutter()
-        self.em_monochromator.openShutter()
-        self.ex_monochromator.setResolution(self.resolution)
-        self.em_monochromator.setResolution(self.resolution)
-        for i in arange(self.em_range.wLMin.value, self.em_range.wLMax.value+self.em_range.wLStep.value, self.em_range.wLStep.value):
-            current_em_wl = WaveLength(i)
-            print(f"Moving to emission wavelength: {current_em_wl.value} nm")
-            self.em_monochromator.moveToWaveLength(current_em_wl)
-            self.measured_signal.append_signal(self.measureSignal())
-            self.reference_signal.append_signal(self.measureReference())
+        wLMin = self.em_range.wLMin.value
+        wLStep = self.em_range.wLStep.value
+        point_count = self.em_range.stepCount() + 1
+        em_steps = self.em_monochromator.getStepsFromWLs(wLMin + np.arange(point_count)*wLStep)
+        self.em_monochromator.checkSteps(em_steps)
+        em_steps = em_steps.tolist()
+        self.prepareMeasure(self.ex_range, WaveLength(wLMin))
+        em_move = self.em_monochromator.moveToStep
+        append_measured = self.measured_signal.append_signal
+        append_reference = self.reference_signal.append_signal
+        measure_signal = self.measureSignal
+        measure_reference = self.measureReference
+        self.measured_signal.preallocate(point_count)
+        self.reference_signal.preallocate(point_count)
+        for k in range(point_count):
+            log.debug("Moving to emission wavelength: %s nm", wLMin + k*wLStep)
+            em_move(em_steps[k])
+            append_measured(measure_signal())
+            append_reference(measure_reference())
         self.ex_monochromator.closeShutter()
         self.em_monochromator.closeShutter()
 
@@ -262,19 +345,18 @@ class EmScanMeasure(Measure):
         """
         Save the results of the measurement to a CSV file.
         """
-        import csv
-        import os
-
         if not os.path.exists(folder):
             os.makedirs(folder)
 
         filename = os.path.join(folder, f"{self.name}.csv")
         with open(filename, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile)
-            now = datetime.now()
-            writer.writerow(['Date :', now.strftime("%Y-%m-%d"), 'Time :', now.strftime("%H:%M:%S"), 'Name :', self.name])
-            writer.writerow(['Ex Wavelength (nm)', 'Em Wavelength (nm)', 'Measured Signal', 'Reference Signal'])
-            for i in range(len(self.measured_signal.signal)):
-                writer.writerow([self.ex_range.value, self.em_range.wLMin.value + i*self.em_range.wLStep.value, self.measured_signal.signal[i], self.reference_signal.signal[i]])
+            date, hour = datetime.now().isoformat(sep=' ', timespec='seconds').split(' ')
+            writer.writerow(['Date :', date, 'Time :', hour, 'Name :', self.name])
+            writer.writerow(CSV_COLUMNS)
+            n = len(self.measured_signal.signal)
+            em = self.em_range.wLMin.value + np.arange(n)*self.em_range.wLStep.value
+            writer.writerows(zip(_wavelengthColumn(np.full(n, self.ex_range.value)), _wavelengthColumn(em),
+                                 self.measured_signal.signal.tolist(), self.reference_signal.signal.tolist()))
 
         print(f"Results saved to {filename} in {folder}")
\ No newline at end of file
@@ -1,32 +1,59 @@
+import logging
 from waveLength import WaveLength
 from slit import Slit
 from serial import Serial
-from time import sleep, time
+from time import sleep, monotonic
 from math import sin, asin
+import numpy as np
+from kernels import step_to_wl_linear, wl_to_step_linear, step_to_wl_sin, wl_to_step_sin
+from serialProtocol import MOVE_DONE, ZERO_DONE, ZERO_TIMEOUT, ERROR, INITIALIZED, errorToken, lineReader, sendCommand, releaseReader
+
+log = logging.getLogger(__name__)
+
+def openSerial(serialPort: str, serialBaudRate: int = 9600) -> Serial:
+    """
+    Open a serial connection to a control board.
+    Returns a closed Serial object if the port cannot be opened.
+    """
+    try:
+        return Serial(serialPort, serialBaudRate, timeout=1)
+    except Exception as e:
+        print(f"Error connecting to serial port {serialPort}: {e}")
+        return Serial()
+
+def closeSerial(connection: Serial):
+    """
+    Stop the reader thread of a connection and close it. Does nothing more for an already closed connection.
+    """
+    releaseReader(connection)
+    connection.close()
 
 """
 Abstract base class for monochromators. Not meant to be instantiated directly.
 """
 class Monochromator:
+    __slots__ = ('wLValue', 'wLOffset', 'wLCoef', '_offsetValue', 'serialPort', 'serialBaudRate',
+                 'serialConnection', 'wLStep', 'minWLStep', 'maxWLStep', '_pendingWLStep', 'em', 'ex')
+
     def __init__(self, wLValue: WaveLength, wLOffset: WaveLength, wLCoef: float, serialPort: str, serialBaudRate: int = 9600, 
-                 wLStep: int = 0, minWLStep:int = 0, maxWLStep:int = 10000, em: bool = True, ex: bool = False, **kwargs):
+                 wLStep: int = 0, minWLStep:int = 0, maxWLStep:int = 10000, em: bool = True, ex: bool = False,
+                 serialConnection: Serial = None, **kwargs):
         self.wLValue = wLValue
         self.wLOffset = wLOffset
         self.wLCoef = wLCoef
+        self._offsetValue = wLOffset.value  # read by every step-wavelength conversion
 
         self.serialPort = serialPort
         self.serialBaudRate = serialBaudRate
-        self.serialConnection = Serial()
-        try:
-            self.serialConnection = Serial(self.serialPort, self.serialBaudRate, timeout=1)
-        except Exception as e:
-            print(f"Error connecting to serial port {self.serialPort}: {e}")
+        # an already opened connection can be given to share one port between several devices
+        self.serialConnection = serialConnection if serialConnection is not None else openSerial(serialPort, serialBaudRate)
 
         if wLStep < minWLStep or wLStep > maxWLStep:
             raise ValueError(f"wLStep must be between {minWLStep} and {maxWLStep}.")
         self.wLStep = wLStep
         self.minWLStep = minWLStep
         self.maxWLStep = maxWLStep
+        self._pendingWLStep = None  # target step of a move sent but not yet acknowledged
 
         if (em and ex) or (not em and not ex):
             raise ValueError("Monochromator must be either emission (em) or excitation (ex), not both or neither.")
@@ -50,32 +77,67 @@ class Monochromator:
         This is a placeholder implementation.
         """
         print("Finding zero position for Monochromator.")
-        self.serialConnection.write(f"ZERO,WL\n".encode())
+        sendCommand(self.serialConnection, b"ZERO,WL\n")
         sleep(0.1)
-        start = time()
-        while True:
-            if time() - start > timeout:
-                raise TimeoutError("Timed out waiting for ZERO,DONE")
-            line = self.serialConnection.readline().decode().strip()
+        reader = lineReader(self.serialConnection)
+        # monotonic clock, a wall clock change cannot stretch or cut the timeout
+        deadline = monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            line = reader.readLine(remaining)
+            remaining = deadline - monotonic()
             if not line:
                 continue
 
             # expect "ZERO,DONE" or "ZERO,TIMEOUT" or "ERROR,UNKNOWN_MOTOR"
-            print(f"Received line: {line}")
-            parts = line.split(',', 2)
-            if parts[0] == "ZERO" and parts[1] == "DONE":
+            log.debug("Received line: %s", line)
+            if line.startswith(ZERO_DONE):
                 self.wLStep = 0
                 self.wLValue = self.wLOffset
                 return
-            if parts[0] == "ZERO" and parts[1] == "TIMEOUT":
+            if line.startswith(ZERO_TIMEOUT):
                 raise TimeoutError("Reported zero-finding timeout")
-            if parts[0] == "ERROR":
-                raise RuntimeError(f"ERROR WL: {parts[1]}")
-            sleep(0.01)
+            if line.startswith(ERROR):
+                raise RuntimeError(f"ERROR WL: {errorToken(line)}")
+        raise TimeoutError("Timed out waiting for ZERO,DONE")
+
+    def _waitForBanner(self, banner: bytes, timeout: float = 100.0):
+        """
+        Read the board output until the given banner line is received.
+        """
+        reader = lineReader(self.serialConnection)
+        deadline = monotonic() + timeout
+        remaining = timeout
+        while True:
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out waiting for {banner.decode()}")
+            line = reader.readLine(remaining)
+            remaining = deadline - monotonic()
+            if not line:
+                continue
+            
+            log.debug("Received line: %s", line)
+            if line == banner:
+                return
+
+    def initMotors(self, timeout: float = 100.0):
+        """
+        Initialize the motors of the monochromator.
+        """
+        self._waitForBanner(INITIALIZED, timeout)
+        sleep(0.1)
+        print("Initializing Monochromator motors.")
+        self.findZero()
 
     def getWaveLengthFromStep(self, wLStep: int) -> WaveLength:
         """ 
         Get the wavelength from the step count.
+        """
+        return WaveLength(self.getWaveLengthValueFromStep(wLStep))
+
+    def getWaveLengthValueFromStep(self, wLStep: int) -> float:
+        """ 
+        Get the wavelength (nm) from the step count as a plain float, for callers that do not need a WaveLength.
         This method should be implemented by subclasses.
         """
         raise NotImplementedError("Subclasses must implement this method.")
@@ -87,6 +149,42 @@ class Monochromator:
         """
         raise NotImplementedError("Subclasses must implement this method.")
     
+    def getWaveLengthsFromSteps(self, wLSteps: np.ndarray) -> np.ndarray:
+        """
+        Get the wavelengths (nm) of an array of step counts, for a whole scan at once.
+        This method should be implemented by subclasses.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def getStepsFromWLs(self, wls: np.ndarray) -> np.ndarray:
+        """
+        Get the step counts of an array of wavelengths (nm), for a whole scan at once.
+        This method should be implemented by subclasses.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def _truncateSteps(self, wls: np.ndarray, wLSteps: np.ndarray) -> np.ndarray:
+        """
+        Truncate the step positions computed by a kernel to step counts, like int().
+        A wavelength the monochromator cannot reach gives a NaN position, cast to an integer it would become
+        a nonsense step count, so it is rejected like the scalar conversion does.
+        """
+        finite = np.isfinite(wLSteps)
+        if not finite.all():
+            raise ValueError(f"Wavelength {wls[~finite][0]} nm cannot be converted to a step count.")
+        return wLSteps.astype(np.int64)
+
+    def checkSteps(self, wLSteps):
+        """
+        Raise ValueError if one of the step counts is out of bounds.
+        Lets a measure reject its targets before any motor moves, the moves are relative and
+        one rejected while the other monochromator travels would leave the step counts out of sync.
+        """
+        wLSteps = np.asarray(wLSteps)
+        outside = (wLSteps < self.minWLStep) | (wLSteps > self.maxWLStep)
+        if outside.any():
+            raise ValueError(f"New wavelength step {wLSteps[outside][0]} is out of bounds ({self.minWLStep}, {self.maxWLStep}).")
+    
     def updateWaveLength(self) -> WaveLength:
         """
         Update the current wavelength, based on the current step count.
@@ -98,38 +196,72 @@ class Monochromator:
         """
         Move to the specified wavelength.
         """
-        print(f"Moving to wavelength: {wL.value} nm")
-        newWLStep = self.getStepFromWL(wL)
+        self.startMoveToWaveLength(wL)
+        self.waitForMove(timeout)
+
+    def startMoveToWaveLength(self, wL: WaveLength):
+        """
+        Send the move command for the specified wavelength without waiting for the motor.
+        Call waitForMove before sending another command to this monochromator.
+        """
+        log.debug("Moving to wavelength: %s nm", wL.value)
+        self.startMoveToStep(self.getStepFromWL(wL))
+
+    def moveToStep(self, newWLStep: int, timeout: float = 20.0):
+        """
+        Move to the specified step count, for callers that already converted the wavelength.
+        """
+        self.startMoveToStep(newWLStep)
+        self.waitForMove(timeout)
+
+    def startMoveToStep(self, newWLStep: int):
+        """
+        Send the move command for the specified step count without waiting for the motor.
+        Call waitForMove before sending another command to this monochromator.
+        """
         if newWLStep < self.minWLStep or newWLStep > self.maxWLStep:
             raise ValueError(f"New wavelength step {newWLStep} is out of bounds ({self.minWLStep}, {self.maxWLStep}).")
+        if newWLStep == self.wLStep:
+            # already there, no command to send and nothing to wait for
+            self.updateWaveLength()
+            return
         direction = newWLStep > self.wLStep
         stepCount = abs(newWLStep - self.wLStep)
-        self.serialConnection.write(f"MOVE,WL,{stepCount},{direction}\n".encode())
+        sendCommand(self.serialConnection, f"MOVE,WL,{stepCount},{int(direction)}\n".encode())
+        self._pendingWLStep = newWLStep
 
-        start = time()
-        while True:
-            if time() - start > timeout:
-                raise TimeoutError("Timed out waiting for MOVE,DONE for WL")
-            line = self.serialConnection.readline().decode().strip()
+    def waitForMove(self, timeout: float = 20.0):
+        """
+        Wait for the move started by startMoveToWaveLength or startMoveToStep to complete.
+        """
+        if self._pendingWLStep is None:
+            return
+        reader = lineReader(self.serialConnection)
+        deadline = monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            line = reader.readLine(remaining)
+            remaining = deadline - monotonic()
             if not line:
                 continue
             
-            print(f"Received line: {line}")
-            parts = line.split(',', 2)
-            if parts[0] == "MOVE" and parts[1] == "DONE":
-                self.wLStep = newWLStep
+            log.debug("Received line: %s", line)
+            if line.startswith(MOVE_DONE):
+                self.wLStep = self._pendingWLStep
+                self._pendingWLStep = None
                 self.updateWaveLength()
                 return
-            if parts[0] == "ERROR":
-                raise RuntimeError(f"ERROR WL {parts[1]}")
-            sleep(0.01)
+            if line.startswith(ERROR):
+                self._pendingWLStep = None
+                raise RuntimeError(f"ERROR WL {errorToken(line)}")
+        raise TimeoutError("Timed out waiting for MOVE,DONE for WL")
         
     
     def openShutter(self):
         """
         Open the shutter of the monochromator.
         """
-        self.serialConnection.write(f"SHUTTER, OPEN\n".encode())
+        self.serialConnection.write(b"SHUTTER, OPEN\n")  # the SHUTTER,OPENED reply is not awaited
         sleep(0.1)  # Allow some time for the shutter to open
         print("Shutter opened.")
     
@@ -137,7 +269,7 @@ class Monochromator:
         """
         Close the shutter of the monochromator.
         """
-        self.serialConnection.write(f"SHUTTER, CLOSE\n".encode())
+        self.serialConnection.write(b"SHUTTER, CLOSE\n")
         sleep(0.1)  # Allow some time for the shutter to close
         print("Shutter closed.")
     
@@ -151,79 +283,61 @@ class Monochromator:
 
 
 class MonochromatorA(Monochromator):
+    __slots__ = ()
+
     def __init__(self, wLValue: WaveLength, wLOffset: WaveLength, wLCoef: float, serialPort: str, serialBaudRate: int = 9600, 
-                 wLStep: int = 0, minWLStep:int = 0, maxWLStep:int = 10000, em: bool = True, ex: bool = False):
-        super().__init__(wLValue, wLOffset, wLCoef, serialPort, serialBaudRate, wLStep, minWLStep, maxWLStep, em, ex)
-        self.serialConnection = Serial()
-        try:
-            self.serialConnection = Serial(self.serialPort, self.serialBaudRate, timeout=1)
-        except Exception as e:
-            print(f"Error connecting to serial port {self.serialPort}: {e}")
+                 wLStep: int = 0, minWLStep:int = 0, maxWLStep:int = 10000, em: bool = True, ex: bool = False,
+                 serialConnection: Serial = None):
+        super().__init__(wLValue, wLOffset, wLCoef, serialPort, serialBaudRate, wLStep, minWLStep, maxWLStep, em, ex,
+                         serialConnection)
 
-    def getWaveLengthFromStep(self, wLStep: int) -> WaveLength:
-        return WaveLength(self.wLOffset.value + self.wLCoef * wLStep)
+    def getWaveLengthValueFromStep(self, wLStep: int) -> float:
+        return self._offsetValue + self.wLCoef * wLStep
     
     def getStepFromWL(self, wl : WaveLength) -> int:
-        return int((wl.value - self.wLOffset.value) / self.wLCoef)
-    
-    def initMotors(self, timeout: float = 100.0):
-        """
-        Initialize the motors of the monochromator.
-        """
-        start = time()
-        while True:
-            if time() - start > timeout:
-                raise TimeoutError("Timed out waiting for Monochromator Control Initialized")
-            line = self.serialConnection.readline().decode().strip()
-            if not line:
-                continue
-            
-            print(f"Received line: {line}")
-            if line == "Monochromator Control Initialized":
-                break
-        sleep(0.1)
-        print("Initializing Monochromator motors.")
-        self.findZero()
-        return
-        
+        return int((float(wl) - self._offsetValue) / self.wLCoef)
+
+    def getWaveLengthsFromSteps(self, wLSteps: np.ndarray) -> np.ndarray:
+        return step_to_wl_linear(np.asarray(wLSteps, dtype=np.float64), self._offsetValue, self.wLCoef)
+
+    def getStepsFromWLs(self, wls: np.ndarray) -> np.ndarray:
+        wls = np.asarray(wls, dtype=np.float64)
+        return self._truncateSteps(wls, wl_to_step_linear(wls, self._offsetValue, self.wLCoef))
+
 class MonochromatorB(Monochromator):
+    __slots__ = ('slits', 'phase', 'resolution')
+
     def __init__(self, wLValue: WaveLength, wLOffset: WaveLength, wLCoef: float, phase: float,
                  slits: Slit, serialPort: str, serialBaudRate: int = 9600, 
-                 wLStep: int = 0, minWLStep:int = 0, maxWLStep:int = 10000, em: bool = True, ex: bool = False):
-        super().__init__(wLValue, wLOffset, wLCoef, serialPort, serialBaudRate, wLStep, minWLStep, maxWLStep, em, ex)
+                 wLStep: int = 0, minWLStep:int = 0, maxWLStep:int = 10000, em: bool = True, ex: bool = False,
+                 serialConnection: Serial = None):
+        super().__init__(wLValue, wLOffset, wLCoef, serialPort, serialBaudRate, wLStep, minWLStep, maxWLStep, em, ex,
+                         serialConnection)
         self.slits = slits
         self.phase = phase
-        self.serialConnection = Serial()
-        try:
-            self.serialConnection = Serial(self.serialPort, self.serialBaudRate, timeout=1)
-        except Exception as e:
-            print(f"Error connecting to serial port {self.serialPort}: {e}")
+        # the slits are driven by the same board, share the connection opened by the base class
         slits.serialConnection = self.serialConnection
 
-    def getWaveLengthFromStep(self, wLStep: int) -> WaveLength:
-        return WaveLength(self.wLOffset.value + self.wLCoef * sin(self.phase * wLStep))
+    def getWaveLengthValueFromStep(self, wLStep: int) -> float:
+        return self._offsetValue + self.wLCoef * sin(self.phase * wLStep)
 
     def getStepFromWL(self, wl : WaveLength) -> int:
-        return int(asin((wl.value - self.wLOffset.value) / self.wLCoef))
+        return int(asin((float(wl) - self._offsetValue) / self.wLCoef) / self.phase)
+
+    def getWaveLengthsFromSteps(self, wLSteps: np.ndarray) -> np.ndarray:
+        return step_to_wl_sin(np.asarray(wLSteps, dtype=np.float64), self._offsetValue, self.wLCoef, self.phase)
+
+    def getStepsFromWLs(self, wls: np.ndarray) -> np.ndarray:
+        wls = np.asarray(wls, dtype=np.float64)
+        with np.errstate(invalid='ignore'):  # out of range wavelengths are reported by _truncateSteps
+            wLSteps = wl_to_step_sin(wls, self._offsetValue, self.wLCoef, self.phase)
+        return self._truncateSteps(wls, wLSteps)
 
     def initMotors(self, timeout: float = 100.0):
         """
-        Initialize the motors of the monochromator.
+        Initialize the motors of the monochromator and of its slits.
         """
-        start = time()
-        while True:
-            if time() - start > timeout:
-                raise TimeoutError("Timed out waiting for Monochromator Control Initialized")
-            line = self.serialConnection.readline().decode().strip()
-            if not line:
-                continue
-            
-            print(f"Received line: {line}")
-            if line == "Monochromator Control Initialized":
-                break
-        sleep(0.1)
-        print("Initializing Monochromator motors.")
-        self.findZero()
+        super().initMotors(timeout)
         self.slits.findZero()
 
     def setResolution(self, resolution: float):
@@ -0,0 +1,123 @@
+"""
+Replies of the Arduino control board (see main.ino), matched as raw bytes on the lines read from the serial port.
+A reply is recognised by its prefix, the checks are ordered with the most frequent replies first.
+"""
+
+import queue
+import threading
+from serial import Serial
+
+MOVE_DONE = b"MOVE,DONE"
+ZERO_DONE = b"ZERO,DONE"
+ZERO_TIMEOUT = b"ZERO,TIMEOUT"
+ERROR = b"ERROR,"
+INITIALIZED = b"Monochromator Control Initialized"
+
+# longest line kept while waiting for its end, the replies are much shorter
+MAX_LINE_LENGTH = 256
+
+_ERROR_LENGTH = len(ERROR)
+
+def errorToken(line: bytes) -> str:
+    """
+    Return the token of an "ERROR,<token>" reply, e.g. "UNKNOWN_MOTOR".
+    """
+    return line[_ERROR_LENGTH:].decode(errors='replace')
+
+
+class SerialReader(threading.Thread):
+    """
+    Background thread draining the lines sent by a control board into a queue,
+    so the program keeps running while the motors move and a reply is handled as soon as it arrives.
+    """
+    def __init__(self, port: Serial):
+        super().__init__(name=f"SerialReader({port.port})", daemon=True)
+        self.port = port
+        self.lines = queue.Queue()
+        self.error = None  # exception that stopped the thread, raised again by readLine
+        self._stopped = threading.Event()
+
+    def run(self):
+        # read(1) blocks until a byte arrives or the port timeout, then everything already received
+        # is read in one call and split into lines here, instead of one read call per byte
+        pending = b""
+        try:
+            while not self._stopped.is_set():
+                data = self.port.read(1)
+                if not data:
+                    continue
+                waiting = self.port.in_waiting
+                if waiting:
+                    data += self.port.read(waiting)
+                *lines, pending = (pending + data).split(b"\n")
+                for line in lines:
+                    line = line.strip()
+                    if line:
+                        self.lines.put(line)
+                if len(pending) > MAX_LINE_LENGTH:
+                    pending = b""  # no line ending in sight, not a reply of the board
+        except OSError as e:  # port closed, never opened or unplugged
+            self.error = e
+        except Exception:
+            # closing the port under a blocked read (see stop) can fail with other errors
+            if not self._stopped.is_set():
+                raise
+
+    def readLine(self, timeout: float) -> bytes:
+        """
+        Return the next line received, or b"" if none arrived within timeout seconds.
+        Blocks until a line arrives or the timeout expires, so the wait loops need not sleep between reads.
+        """
+        if self.error is not None and self.lines.empty():
+            raise self.error
+        try:
+            return self.lines.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return b""
+
+    def stop(self, timeout: float = 2.0):
+        """
+        Stop the thread and close its port, which also ends a read blocked in the thread.
+        """
+        self._stopped.set()
+        self.port.close()
+        self.join(timeout)
+
+    def discardLines(self):
+        """
+        Drop the lines received but not read yet, e.g. a late reply to a command that timed out.
+        """
+        with self.lines.mutex:
+            self.lines.queue.clear()
+
+
+# one reader per connection, the connections are shared between the devices of a control board
+_readers = {}
+_readersLock = threading.Lock()
+
+def lineReader(connection: Serial) -> SerialReader:
+    """
+    Return the reader of the connection, started on first use.
+    """
+    with _readersLock:
+        reader = _readers.get(connection)
+        if reader is None:
+            reader = _readers[connection] = SerialReader(connection)
+            reader.start()
+        return reader
+
+def releaseReader(connection: Serial):
+    """
+    Stop the reader of the connection if it has one, so a reopened port is not drained by a stale thread.
+    """
+    with _readersLock:
+        reader = _readers.pop(connection, None)
+    if reader is not None:
+        reader.stop()
+
+def sendCommand(connection: Serial, command: bytes):
+    """
+    Write a command to the board, after dropping the unread lines so a stale reply cannot be taken for its answer.
+    """
+    lineReader(connection).discardLines()
+    connection.write(command)
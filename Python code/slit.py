@@ -1,11 +1,21 @@
+import logging
 from waveLength import WaveLength
 from serial import Serial
-from time import sleep, time
+from time import sleep, monotonic
+from serialProtocol import MOVE_DONE, ZERO_DONE, ZERO_TIMEOUT, ERROR, errorToken, lineReader, sendCommand
+
+log = logging.getLogger(__name__)
 
 class Slit:
+    __slots__ = ('number', '_zeroCommand', '_movePrefixes', 'value', 'offsetWL', 'coefWL',
+                 'serialConnection', 'step', 'minStep', 'maxStep')
+
     def __init__(self, numberOfSlits: int, value: WaveLength, offsetWL: WaveLength, coefWL: float, 
                  serialConnection: Serial = Serial(), step: int = 0, minStep: int = -1000, maxStep: int = 10000):
         self.number = numberOfSlits
+        # commands sent to all the slits at once, encoded a single time
+        self._zeroCommand = b"".join(b"ZERO,SLIT%d\n" % i for i in range(1, numberOfSlits + 1))
+        self._movePrefixes = [b"MOVE,SLIT%d," % i for i in range(1, numberOfSlits + 1)]
         self.value = value
         self.offsetWL = offsetWL
         self.coefWL = coefWL
@@ -21,13 +31,13 @@ class Slit:
         """
         Get the resolution value.
         """
-        return WaveLength(self.offsetWL.value + self.coefWL * step)
+        return WaveLength(float(self.offsetWL) + self.coefWL * step)
 
     def getStepFromValue(self, value: WaveLength):
         """
         Set the resolution value.
         """
-        return int((value.value - self.offsetWL.value) / self.coefWL)
+        return int((float(value) - self.offsetWL) / self.coefWL)
 
     def updateWaveLength(self):
         """
@@ -40,62 +50,19 @@ class Slit:
         Find the zero position of the monochromator.
         This is a placeholder implementation.
         """
-        for i in range(1, self.number + 1):
-            print(f"Finding zero position for SLIT {i}.")
-            self.serialConnection.write(f"ZERO,SLIT{i}\n".encode())
-            sleep(0.1)
-            start = time()
-            while True:
-                if time() - start > timeout:
-                    raise TimeoutError("Timed out waiting for ZERO,DONE")
-                line = self.serialConnection.readline().decode().strip()
-                if not line:
-                    continue
-
-                # expect "ZERO,DONE" or "ZERO,TIMEOUT" or "ERROR,UNKNOWN_MOTOR"
-                print(f"Received line: {line}")
-                parts = line.split(',', 2)
-                if parts[0] == "ZERO" and parts[1] == "DONE":
-                    self.step = 0
-                    self.value = self.offsetWL
-                    return
-                if parts[0] == "ZERO" and parts[1] == "TIMEOUT":
-                    raise TimeoutError("MCU reported zero-finding timeout")
-                if parts[0] == "ERROR":
-                    raise RuntimeError(f"ERROR SLIT{i}: {parts[1]}")
-                sleep(0.01)
+        print(f"Finding zero position for SLIT 1 to {self.number}.")
+        sendCommand(self.serialConnection, self._zeroCommand)
+        sleep(0.1)
+        self._waitForDone(ZERO_DONE, timeout)
+        self.step = 0
+        self.value = self.offsetWL
 
     def moveToValue(self, value: WaveLength, timeout: float = 20.0):
         """
         Move the monochromator to the specified wavelength value.
         """
-        print(f"Moving to wavelength: {value.value} nm")
-        newStep = self.getStepFromValue(value.value)
-        if newStep < self.minStep or newStep > self.maxStep:
-            raise ValueError(f"New wavelength step {newStep} is out of bounds ({self.minStep}, {self.maxStep}).")
-        direction = newStep > self.step
-        stepCount = abs(newStep - self.step)
-        for i in range(1, self.number + 1):
-            print(f"Name: SLIT{i}, Direction: {direction}, Step Count: {stepCount}")
-            self.serialConnection.write(f"MOVE,SLIT{i},{stepCount},{direction}\n".encode())
-
-            start = time()
-            while True:
-                if time() - start > timeout:
-                    raise TimeoutError(f"Timed out waiting for MOVE,DONE for SLIT{i}")
-                line = self.serialConnection.readline().decode().strip()
-                if not line:
-                    continue
-
-                print(f"Received line: {line}")
-                parts = line.split(',', 2)
-                if parts[0] == "MOVE" and parts[1] == "DONE":
-                    self.step = newStep
-                    self.updateWaveLength()
-                    return
-                if parts[0] == "ERROR":
-                    raise RuntimeError(f"ERROR SLIT{i}: {parts[1]}")
-                sleep(0.01)
+        log.debug("Moving slits to: %s nm", value.value)
+        self._moveToStep(self.getStepFromValue(value), timeout)
     
     def moveToPercentage(self, percentage: float, timeout: float = 20.0):
         """
@@ -103,29 +70,45 @@ class Slit:
         """
         if percentage < 0 or percentage > 100:
             raise ValueError("Percentage must be between 0 and 100.")
-        newStep = int(self.minStep + (self.maxStep - self.minStep) * (percentage / 100))
+        self._moveToStep(int(self.minStep + (self.maxStep - self.minStep) * (percentage / 100)), timeout)
+
+    def _moveToStep(self, newStep: int, timeout: float = 20.0):
+        """
+        Move all the slits to the given step count and wait for every one of them.
+        """
         if newStep < self.minStep or newStep > self.maxStep:
             raise ValueError(f"New wavelength step {newStep} is out of bounds ({self.minStep}, {self.maxStep}).")
         direction = newStep > self.step
         stepCount = abs(newStep - self.step)
-        for i in range(1, self.number + 1):
-            print(f"Name: SLIT{i}, Direction: {direction}, Step Count: {stepCount}")
-            self.serialConnection.write(f"MOVE,SLIT{i},{stepCount},{direction}\n".encode())
+        log.debug("Name: SLIT1 to SLIT%d, Direction: %s, Step Count: %d", self.number, direction, stepCount)
+        arguments = b"%d,%d\n" % (stepCount, direction)
+        sendCommand(self.serialConnection, b"".join(prefix + arguments for prefix in self._movePrefixes))
+        self._waitForDone(MOVE_DONE, timeout)
+        self.step = newStep
+        self.updateWaveLength()
+
+    def _waitForDone(self, done: bytes, timeout: float = 20.0):
+        """
+        Read the board replies until one `done` reply (e.g. b"MOVE,DONE") has been received per slit.
+        The commands of all slits are sent at once, the timeout applies to each slit.
+        """
+        reader = lineReader(self.serialConnection)
+        count = 0
+        remaining = timeout * self.number
+        deadline = monotonic() + remaining
+        while count < self.number:
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out waiting for {done.decode()} ({count}/{self.number} slits done)")
+            line = reader.readLine(remaining)
+            remaining = deadline - monotonic()
+            if not line:
+                continue
 
-            start = time()
-            while True:
-                if time() - start > timeout:
-                    raise TimeoutError(f"Timed out waiting for MOVE,DONE for SLIT{i}")
-                line = self.serialConnection.readline().decode().strip()
-                if not line:
-                    continue
-                
-                print(f"Received line: {line}")
-                parts = line.split(',', 2)
-                if parts[0] == "MOVE" and parts[1] == "DONE":
-                    self.step = newStep
-                    self.updateWaveLength()
-                    return
-                if parts[0] == "ERROR":
-                    raise RuntimeError(f"ERROR SLIT{i}: {parts[1]}")
-                sleep(0.01)
\ No newline at end of file
+            # expect "MOVE,DONE" / "ZERO,DONE", "ZERO,TIMEOUT" or "ERROR,UNKNOWN_MOTOR", compared as raw bytes
+            log.debug("Received line: %s", line)
+            if line.startswith(done):
+                count += 1
+            elif line.startswith(ZERO_TIMEOUT):
+                raise TimeoutError(f"MCU reported zero-finding timeout for SLIT{count + 1}")
+            elif line.startswith(ERROR):
+                raise RuntimeError(f"ERROR SLIT{count + 1}: {errorToken(line)}")
@@ -1,44 +1,91 @@
+import numpy as np
+
 """ Base class for signals. """
 class Signal:
     from typing import Optional, List, Any
+    # signal is a property over the filled part of _buf
+    __slots__ = ('name', '_buf', '_size')
 
     def __init__(self, name: str, signal: Optional[List[Any]] = None):
         self.name = name
         self.signal = [] if signal is None else signal
 
+    @property
+    def signal(self) -> np.ndarray:
+        """
+        Values of the signal, a float64 view on the filled part of the buffer.
+        """
+        return self._buf[:self._size]
+
+    @signal.setter
+    def signal(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self._buf = np.empty(max(values.size, 64), dtype=np.float64)
+        self._buf[:values.size] = values
+        self._size = values.size
+
     def __str__(self):
         return f"Signal(signal={self.signal})"
+
+    def _reserve(self, size: int):
+        """
+        Grow the buffer to hold at least size values, doubling its capacity so appends stay O(1) amortized.
+        """
+        capacity = self._buf.size
+        if capacity >= size:
+            return
+        while capacity < size:
+            capacity *= 2
+        buf = np.empty(capacity, dtype=np.float64)
+        buf[:self._size] = self._buf[:self._size]
+        self._buf = buf
     
-    def add_signal(self, new_signal: list):
+    def add_signal(self, new_signal):
         """
         Add a new signal to the existing signal.
         """
-        if not self.signal:
-            self.signal = new_signal
-        else:
-            self.signal.extend(new_signal)
+        new_signal = np.asarray(new_signal, dtype=np.float64)
+        need = self._size + new_signal.size
+        self._reserve(need)
+        self._buf[self._size:need] = new_signal
+        self._size = need
     
     def append_signal(self, value: float):
         """
         Append a single value to the existing signal.
         """
-        if self.signal is None:
-            self.signal = [value]
-        else:
-            self.signal.append(value)
+        if self._size == self._buf.size:
+            self._reserve(self._size + 1)
+        self._buf[self._size] = value
+        self._size += 1
+
+    def preallocate(self, size: int):
+        """
+        Clear the signal and reserve room for size values, so an acquisition of known length never regrows the buffer.
+        """
+        self._size = 0
+        self._reserve(size)
 
     def clear_signal(self):
         """
         Clear the existing signal.
         """
-        self.signal = []
+        self._size = 0
+
+    def _operands(self, other: 'Signal'):
+        """
+        Return the values of both signals, cut to the shorter length like zip would.
+        """
+        n = min(self._size, other._size)
+        return self._buf[:n], other._buf[:n]
 
     def __add__(self, other) -> 'Signal':
         """
         Overload the '+' operator to sum two signals.
         """
         if isinstance(other, Signal):
-            new_signal = [a + b for a, b in zip(self.signal, other.signal)]
+            a, b = self._operands(other)
+            new_signal = a + b
             new_name = f"{self.name} + {other.name}"
             return Signal(new_name, new_signal)
         return NotImplemented
@@ -48,7 +95,8 @@ class Signal:
         Overload the '-' operator to subtract two signals.
         """
         if isinstance(other, Signal):
-            new_signal = [a - b for a, b in zip(self.signal, other.signal)]
+            a, b = self._operands(other)
+            new_signal = a - b
             new_name = f"{self.name} - {other.name}"
             return Signal(new_name, new_signal)
         return NotImplemented
@@ -58,7 +106,8 @@ class Signal:
         Overload the '*' operator to multiply two signals.
         """
         if isinstance(other, Signal):
-            new_signal = [a * b for a, b in zip(self.signal, other.signal)]
+            a, b = self._operands(other)
+            new_signal = a * b
             new_name = f"{self.name} * {other.name}"
             return Signal(new_name, new_signal)
         return NotImplemented
@@ -68,7 +117,8 @@ class Signal:
         Overload the '/' operator to divide two signals.
         """
         if isinstance(other, Signal):
-            new_signal = [a / b if b != 0 else 0 for a, b in zip(self.signal, other.signal)]
+            a, b = self._operands(other)
+            new_signal = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
             new_name = f"{self.name} / {other.name}"
             return Signal(new_name, new_signal)
         return NotImplemented
\ No newline at end of file
@@ -1,6 +1,15 @@
-class WaveLength():
-    def __init__(self, value):
-        self.value = value
+class WaveLength(float):
+    """
+    Wavelength in nm. A float subclass, so it can be used directly in arithmetic and numpy code.
+    """
+    __slots__ = ('_waveNumber', '_frequency')  # caches of to_waveNumber and to_frequency
+
+    def __new__(cls, value):
+        return super().__new__(cls, value)
+
+    @property
+    def value(self) -> float:
+        return float(self)
 
     def __str__(self):
         return f"WaveLength({self.value}nm)"
@@ -9,37 +18,61 @@ class WaveLength():
         """
         Convert wavelength to wavenumber.
         Wavenumber (cm^-1) = 10^4 / wavelength (nm)
+        The result is computed on the first call and cached, a WaveLength is immutable.
         """
-        if self.value == 0:
-            raise ValueError("Wavelength cannot be zero for wavenumber conversion.")
-        return 10**4 / self.value
+        try:
+            return self._waveNumber
+        except AttributeError:
+            if self == 0:
+                raise ValueError("Wavelength cannot be zero for wavenumber conversion.")
+            self._waveNumber = 10**4 / float(self)
+            return self._waveNumber
     
     def to_frequency(self):
         """
         Convert wavelength to frequency.
         Frequency (Hz) = speed of light (m/s) / wavelength (m)
+        The result is computed on the first call and cached, like to_waveNumber.
         """
-        speed_of_light = 299792458
-        if self.value == 0:
-            raise ValueError("Wavelength cannot be zero for frequency conversion.")
-        return speed_of_light / self.value
+        try:
+            return self._frequency
+        except AttributeError:
+            speed_of_light = 299792458
+            if self == 0:
+                raise ValueError("Wavelength cannot be zero for frequency conversion.")
+            self._frequency = speed_of_light / float(self)
+            return self._frequency
 
+    # scalar sums and differences stay WaveLength, other float operations return plain floats.
+    # NotImplemented (e.g. for a numpy array) is passed on so the other operand handles the operation.
     def __add__(self, other: float) -> 'WaveLength':
-        return WaveLength(self.value + other)
+        result = float.__add__(self, other)
+        return result if result is NotImplemented else WaveLength(result)
     
     def __radd__(self, other: float) -> 'WaveLength':
-        return WaveLength(other + self.value)
+        result = float.__radd__(self, other)
+        return result if result is NotImplemented else WaveLength(result)
     
     def __sub__(self, other: float) -> 'WaveLength':
-        return WaveLength(self.value - other)
+        result = float.__sub__(self, other)
+        return result if result is NotImplemented else WaveLength(result)
 
 class WLRange:
+    __slots__ = ('wLStep', 'wLMin', 'wLMax')
+
     def __init__(self, wLMin:WaveLength, wLMax: WaveLength, wLStep: WaveLength):
         self.wLStep = wLStep
-        if wLMin.value >= wLMax.value:
+        if wLMin >= wLMax:
             raise ValueError("Minimum wavelength must be less than maximum wavelength.")
         self.wLMin = wLMin
         self.wLMax = wLMax
         
+    def stepCount(self) -> int:
+        """
+        Number of whole steps between wLMin and wLMax (with a small tolerance for floating point error).
+        The range contains stepCount() + 1 wavelengths, starting at wLMin and never exceeding wLMax.
+        """
+        return int((self.wLMax - self.wLMin) / self.wLStep + 1e-9)
+
     def __str__(self):
         return f"WLRange(wLMin={self.wLMin.value}, wLMax={self.wLMax.value}, wLStep={self.wLStep.value})"